@@ -0,0 +1,158 @@
+'''Max flow routines for the badminton elimination network, compiled with numba.
+
+Graphs are stored in forward-star form: edge 2k is the k-th edge of the
+network and edge 2k+1 is its reverse (residual) edge, head[u] is the first
+edge leaving node u (or -1), next_[e] is the next edge leaving the same node
+as e (or -1) and to[e] is the node edge e points at.
+'''
+
+import numpy as np
+from numba import njit
+
+
+def forward_star(graph):
+    '''Builds forward-star adjacency arrays for a scipy CSR capacity matrix.
+    Edge 2k is the k-th stored entry of the matrix, so its capacities can be
+    copied straight from graph.data into cap[0::2].
+
+    graph: scipy.sparse.csr_matrix of edge capacities
+    return: (head, next_, to) int32 arrays
+    '''
+    n = graph.shape[0]
+    src = np.repeat(np.arange(n, dtype=np.int32), np.diff(graph.indptr))
+    dst = graph.indices.astype(np.int32)
+
+    to = np.empty(2 * len(dst), dtype=np.int32)
+    to[0::2] = dst
+    to[1::2] = src
+    tail = np.empty_like(to)
+    tail[0::2] = src
+    tail[1::2] = dst
+
+    head = np.full(n, -1, dtype=np.int32)
+    next_ = np.empty_like(to)
+    for e in range(len(to)):
+        next_[e] = head[tail[e]]
+        head[tail[e]] = e
+    return head, next_, to
+
+
+@njit(cache=True)
+def edmonds_karp(head, next_, to, cap, s, t, n):
+    '''Returns the value of a maximum flow from s to t, augmenting along
+    shortest paths found by BFS. cap holds the capacity of every edge and its
+    reverse edge (0 for reverse edges) and is not modified.
+    '''
+    residual = cap.copy()
+    parent = np.empty(n, dtype=np.int32)
+    queue = np.empty(n, dtype=np.int32)
+    flow = 0
+    while True:
+        # BFS from s over edges with residual capacity, remembering the edge
+        # used to reach each node
+        parent[:] = -1
+        parent[s] = len(to)
+        queue[0] = s
+        front, back = 0, 1
+        while front < back and parent[t] == -1:
+            u = queue[front]
+            front += 1
+            e = head[u]
+            while e != -1:
+                v = to[e]
+                if parent[v] == -1 and residual[e] > 0:
+                    parent[v] = e
+                    queue[back] = v
+                    back += 1
+                e = next_[e]
+        if parent[t] == -1:
+            return flow
+
+        # find the bottleneck along the path & push that much flow
+        bottleneck = residual[parent[t]]
+        v = t
+        while v != s:
+            e = parent[v]
+            bottleneck = min(bottleneck, residual[e])
+            v = to[e ^ 1]
+        v = t
+        while v != s:
+            e = parent[v]
+            residual[e] -= bottleneck
+            residual[e ^ 1] += bottleneck
+            v = to[e ^ 1]
+        flow += bottleneck
+
+
+@njit(cache=True)
+def dinitz(head, next_, to, cap, s, t, n):
+    '''Returns the value of a maximum flow from s to t using Dinitz's
+    algorithm: a BFS builds the level graph, then blocking flow is pushed
+    along it with an iterative DFS that keeps a current edge per node. cap is
+    laid out as for edmonds_karp and is not modified.
+    '''
+    residual = cap.copy()
+    level = np.empty(n, dtype=np.int32)
+    queue = np.empty(n, dtype=np.int32)
+    current = np.empty(n, dtype=np.int32)
+    path = np.empty(n, dtype=np.int32)
+    flow = 0
+    while True:
+        # BFS from s to label every node with its distance in the residual graph
+        level[:] = -1
+        level[s] = 0
+        queue[0] = s
+        front, back = 0, 1
+        while front < back:
+            u = queue[front]
+            front += 1
+            e = head[u]
+            while e != -1:
+                v = to[e]
+                if level[v] == -1 and residual[e] > 0:
+                    level[v] = level[u] + 1
+                    queue[back] = v
+                    back += 1
+                e = next_[e]
+        if level[t] == -1:
+            return flow
+
+        # push blocking flow along edges that go up exactly one level
+        current[:] = head
+        depth = 0
+        u = s
+        while True:
+            if u == t:
+                bottleneck = residual[path[0]]
+                for k in range(1, depth):
+                    bottleneck = min(bottleneck, residual[path[k]])
+                for k in range(depth):
+                    residual[path[k]] -= bottleneck
+                    residual[path[k] ^ 1] += bottleneck
+                flow += bottleneck
+
+                # retreat to the tail of the first edge that is now saturated
+                k = 0
+                while residual[path[k]] > 0:
+                    k += 1
+                depth = k
+                u = to[path[k] ^ 1]
+                continue
+
+            e = current[u]
+            while e != -1 and (residual[e] == 0 or level[to[e]] != level[u] + 1):
+                e = next_[e]
+            current[u] = e
+
+            if e != -1:
+                path[depth] = e
+                depth += 1
+                u = to[e]
+            elif u == s:
+                break
+            else:
+                # dead end, so drop u from the level graph & back up one edge
+                level[u] = -1
+                depth -= 1
+                u = to[path[depth] ^ 1]
+                current[u] = next_[current[u]]
@@ -3,12 +3,11 @@ Spring 2021 at Olin College. The code for this lab has been adapted from:
 https://github.com/ananya77041/baseball-elimination/blob/master/src/BaseballElimination.java'''
 
 import sys
-import math
-import picos as pic
-import networkx as nx
-import itertools
-import cvxopt
-import matplotlib.pyplot as plt
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from scipy.sparse import csr_matrix
 
 
 class Division:
@@ -23,8 +22,11 @@ class Division:
 
     def __init__(self, filename):
         self.teams = {}
-        self.G = nx.DiGraph()
+        self.G = None
+        self.flow_graph = None
         self.readDivision(filename)
+        self._build_flow_template()
+        self._build_lp_template()
 
     def readDivision(self, filename):
         '''Reads the information from the given file and builds up a dictionary
@@ -33,14 +35,70 @@ class Division:
         filename: name of text file representing tournament outcomes so far
         & remaining games for each team
         '''
-        f = open(filename, "r")
-        lines = [line.split() for line in f.readlines()]
-        f.close()
-
-        lines = lines[1:]
-        for ID, teaminfo in enumerate(lines):
-            team = Team(int(ID), teaminfo[0], int(teaminfo[1]), int(teaminfo[2]), int(teaminfo[3]), list(map(int, teaminfo[4:])))
-            self.teams[ID] = team
+        with open(filename, "r") as f:
+            n = int(f.readline())
+
+        data = np.loadtxt(filename, skiprows=1, usecols=tuple(range(1, 4 + n)), dtype=np.int32, ndmin=2)
+        names = np.loadtxt(filename, skiprows=1, usecols=(0,), dtype=str, ndmin=1)
+        self.names = names
+        self.wins = data[:, 0]
+        self.losses = data[:, 1]
+        self.remaining = data[:, 2]
+        self.against = data[:, 3:]
+        for ID, row in enumerate(data[:, :3].tolist()):
+            self.teams[ID] = Team(ID, self.names[ID], *row)
+
+    def _build_flow_template(self):
+        '''Caches the games left between every pair of teams and a capacity
+        matrix for the flow network over the whole division. Source is node 0,
+        pairs are 1..P, teams are P+1..P+N and the sink is the last node, so
+        the source capacities are the first P entries of its data and the sink
+        capacities are the last N. _build_edges only rewrites those slices.
+        '''
+        n = len(self.teams)
+        i_up, j_up = np.triu_indices(n, k=1)
+        self._pair_idx = (i_up, j_up)
+        self._pair_games = self.against[i_up, j_up]
+        self._pair_caps = dict(zip(zip(i_up.tolist(), j_up.tolist()), self._pair_games.tolist()))
+
+        P = len(self._pair_games)
+        sink = P + n + 1
+        indptr = np.concatenate([[0, P], P + 2 * np.arange(1, P + 1), 3 * P + np.arange(1, n + 1), [3 * P + n]])
+        indices = np.concatenate([
+            np.arange(1, P + 1),
+            np.column_stack([P + 1 + i_up, P + 1 + j_up]).ravel(),
+            np.full(n, sink),
+        ])
+        data = np.concatenate([self._pair_games, np.repeat(self._pair_games, 2), np.zeros(n)])
+        self._flow_template = csr_matrix(
+            (data.astype(np.int32), indices.astype(np.int32), indptr.astype(np.int32)),
+            shape=(sink + 1, sink + 1))
+        self._forward_star = None
+
+    def _build_lp_template(self):
+        '''Caches the parts of the max flow LP that are the same for every
+        team: one flow variable per edge of the cached capacity matrix, the
+        objective & the flow conservation constraints. Only the bounds change
+        between teams, and linear_programming reads those from the matrix.
+        '''
+        graph = self._flow_template
+        n_nodes, n_edges = graph.shape[0], graph.nnz
+        src = np.repeat(np.arange(n_nodes), np.diff(graph.indptr))
+        dst = graph.indices
+
+        # maximize flow out of source (linprog minimizes, so negate)
+        self._lp_c = -(src == 0).astype(float)
+
+        # flow_in == flow_out for each node other than source & sink, as a
+        # signed incidence matrix with interior node k on row k - 1
+        edge_ids = np.arange(n_edges)
+        out_mask = src != 0
+        in_mask = dst != n_nodes - 1
+        rows = np.concatenate([src[out_mask] - 1, dst[in_mask] - 1])
+        cols = np.concatenate([edge_ids[out_mask], edge_ids[in_mask]])
+        data = np.concatenate([-np.ones(out_mask.sum()), np.ones(in_mask.sum())])
+        self._lp_A_eq = csr_matrix((data, (rows, cols)), shape=(n_nodes - 2, n_edges))
+        self._lp_b_eq = np.zeros(n_nodes - 2)
 
     def get_team_IDs(self):
         '''Gets the list of IDs that are associated with each of the teams
@@ -62,61 +120,60 @@ class Division:
         programming solver
         return: True if eliminated, False otherwise
         '''
-        flag1 = False
-        team = self.teams[teamID]
+        if teamID not in self.teams:
+            raise ValueError("Team does not exist in given input.")
 
-        temp = dict(self.teams)
-        del temp[teamID]
+        ceiling = self.wins[teamID] + self.remaining[teamID]
+        others = np.delete(np.arange(len(self.teams)), teamID)
 
-        for _, other_team in temp.items():
-            if team.wins + team.remaining < other_team.wins:
-                flag1 = True
+        if np.any(self.wins[others] > ceiling):
+            return True
+
+        # Bound the max flow by cuts of the network before building it
+        caps = ceiling - self.wins[others] - 1
+        if np.any(caps < 0):
+            # even if we win all games, still can't finish ahead of this team
+            return True
+
+        games = self.against[np.ix_(others, others)]
+        if caps.sum() < np.triu(games, k=1).sum():
+            # the cut around the sink can't carry every remaining game
+            return True
+
+        if np.all(games.sum(axis=1) <= caps):
+            # every team can win all of its remaining games without passing us
+            return False
 
         saturated_edges = self.create_network(teamID)
-        if not flag1:
-            if solver == "Network Flows":
-                flag1 = self.network_flows(saturated_edges)
-            elif solver == "Linear Programming":
-                flag1 = self.linear_programming(saturated_edges)
+        flag1 = False
+        if solver == "Network Flows":
+            flag1 = self.network_flows(saturated_edges)
+        elif solver == "Linear Programming":
+            flag1 = self.linear_programming(saturated_edges)
 
         return flag1
 
     def create_network(self, teamID, show=False):
         '''Builds up the network needed for solving the badminton elimination
-        problem as a network flows problem & stores it in self.G. Returns a
+        problem as a network flows problem in self.flow_graph. Returns a
         dictionary of saturated edges that maps team pairs to the amount of
         additional games they have against each other.
 
         teamID: ID of team that we want to check if it is eliminated
+        show: if True, also build the network as a networkx graph in self.G
+        and draw it
         return: dictionary of saturated edges that maps team pairs to
         the amount of additional games they have against each other
         '''
+        if teamID not in self.teams:
+            raise ValueError("Team does not exist in given input.")
 
-        saturated_edges = {}
-
-        # Reset the graph
-        self.G = nx.DiGraph()
-
-        # Get dict of all other teams
-        remaining_teams = dict(self.teams)
-        remaining_teams.pop(teamID)
-
-        # Populate saturated edges and first layer of G
-        for pair in itertools.combinations(remaining_teams, 2):
-            num = self.teams[pair[0]].get_against(pair[1])
-            saturated_edges[pair] = num
-            self.G.add_edge('S', pair, capacity=num)
-
-        # Populate second layer of G
-        for pair in saturated_edges:
-            self.G.add_edge(pair, pair[0])
-            self.G.add_edge(pair, pair[1])
-
-        # Populate third layer of G
-        for team in remaining_teams:
-            self.G.add_edge(team, 'T', capacity=self.max_allowed(teamID, team))
+        saturated_edges = self._build_edges(teamID)
 
         if show:
+            import networkx as nx
+            import matplotlib.pyplot as plt
+            self._build_networkx(teamID, saturated_edges)
             pos = nx.spring_layout(self.G)
             labels = {}
             for edge in self.G.edges:
@@ -125,30 +182,85 @@ class Division:
             nx.draw_networkx(self.G, pos=pos)
             nx.draw_networkx_edge_labels(self.G, pos, edge_labels=labels)
             plt.show()
-        
+
         return saturated_edges
 
+    def _build_edges(self, teamID):
+        '''Points self.flow_graph at the cached capacity matrix with this
+        team's pairs & its edge to the sink cut off, which is all both solvers
+        need. Returns the dictionary of saturated edges.
+        '''
+        # Get all other teams & the games left between each pair of them
+        idx = np.delete(np.arange(len(self.teams)), teamID)
+        caps = self.wins[teamID] + self.remaining[teamID] - self.wins[idx] - 1
+        saturated_edges = {pair: num for pair, num in self._pair_caps.items() if teamID not in pair}
+
+        P = len(self._pair_games)
+        i_up, j_up = self._pair_idx
+        data = self._flow_template.data
+        data[:P] = np.where((i_up == teamID) | (j_up == teamID), 0, self._pair_games)
+        data[3 * P:] = 0
+        data[3 * P + idx] = np.maximum(caps, 0)
+        self.flow_graph = self._flow_template
+        self._sink_caps = caps
+        self._games_remaining = sum(saturated_edges.values())
+
+        return saturated_edges
+
+    def _build_networkx(self, teamID, saturated_edges):
+        '''Builds the same network as a networkx graph in self.G, with team
+        pairs & team IDs as nodes and 'S' & 'T' as source & sink. Only used
+        for drawing, so it is not built unless asked for.
+        '''
+        import networkx as nx
+
+        # Reset the graph
+        self.G = nx.DiGraph()
+
+        # Populate first & second layer of G
+        for pair, num in saturated_edges.items():
+            self.G.add_edge('S', pair, capacity=num)
+            self.G.add_edge(pair, pair[0])
+            self.G.add_edge(pair, pair[1])
+
+        # Populate third layer of G
+        for team in self.teams:
+            if team != teamID:
+                self.G.add_edge(team, 'T', capacity=self.max_allowed(teamID, team))
+
     def max_allowed(self, t1: int, t2: int) -> int:
         """Given two team id's t1 and t2, assume t1 wins all of their remaining
         games. Then, find out and return how many games t2 can win without
         displacing t1 from the top of the leaderboard.
         """
-        team1 = self.teams[t1]
-        team2 = self.teams[t2]
-        return team1.wins + team1.remaining - team2.wins - 1
+        return int(self.wins[t1] + self.remaining[t1] - self.wins[t2] - 1)
 
-    def network_flows(self, saturated_edges):
+    def network_flows(self, saturated_edges, flow_func="dinitz"):
         '''Uses network flows to determine if the team with given team ID
-        has been eliminated. You can feel free to use the built in networkx
-        maximum flow function or the maximum flow function you implemented as
-        part of the in class implementation activity.
+        has been eliminated. The max flow is computed by one of the numba
+        compiled max flow functions in _flow.py on the network built by
+        create_network. Dinitz is the default since it is much faster than
+        Edmonds-Karp on these dense three layer networks.
 
         saturated_edges: dictionary of saturated edges that maps team pairs to
         the amount of additional games they have against each other
+        flow_func: name of the max flow function to use, either "dinitz" or
+        "edmonds_karp"
         return: True if team is eliminated, False otherwise
         '''
-        max_flow, flows = nx.algorithms.flow.maximum_flow(self.G, 'S', 'T')
-        games_remaining = sum([x for x in saturated_edges.values()])
+        import _flow
+
+        # the forward-star arrays only depend on the shape of the network, so
+        # they are built the first time & only the capacities are updated
+        if self._forward_star is None:
+            head, next_, to = _flow.forward_star(self.flow_graph)
+            self._forward_star = (head, next_, to, np.zeros(len(to), dtype=np.int32))
+        head, next_, to, cap = self._forward_star
+        cap[0::2] = self.flow_graph.data
+
+        n = self.flow_graph.shape[0]
+        max_flow = getattr(_flow, flow_func)(head, next_, to, cap, 0, n - 1, n)
+        games_remaining = self._games_remaining
         print(f"max flow nf: {max_flow}")
         print(f"games remaining nf: {games_remaining}")
 
@@ -156,74 +268,29 @@ class Division:
 
     def linear_programming(self, saturated_edges):
         '''Uses linear programming to determine if the team with given team ID
-        has been eliminated. We recommend using a picos solver to solve the
-        linear programming problem once you have it set up.
-        Do not use the flow_constraint method that Picos provides (it does all of the work for you)
-        We want you to set up the constraint equations using picos (hint: add_constraint is the method you want)
+        has been eliminated. The max flow LP cached by _build_lp_template is
+        bounded by the capacities create_network filled in and solved with
+        scipy's HiGHS backend.
 
         saturated_edges: dictionary of saturated edges that maps team pairs to
         the amount of additional games they have against each other
         returns True if team is eliminated, False otherwise
         '''
+        if np.any(self._sink_caps < 0):
+            # even if we win all games, still behind this team
+            # eliminate now, no need to solve
+            return True
 
-        maxflow=pic.Problem()
-
-        F = maxflow.add_variable('F')
-        f = {}
-
-        # get edge capacities
-        c={}
-        for e in self.G.edges():
-            d = self.G[e[0]][e[1]]
-            if "capacity" in d:
-                if d["capacity"] < 0: 
-                    # even if we win all games, still behind this team
-                    # eliminate now, no need to solve
-                    return True
-                c[(e[0], e[1])]  = d["capacity"]
-        cap=pic.new_param('c',c)
-
-        # 0 <= flow <= capacity for each edge
-        for e in self.G.edges():
-            f[e] = maxflow.add_variable(f'f[{e}]')
-            if "capacity" in self.G[e[0]][e[1]]:
-                maxflow.add_constraint(f[e] <= cap[e])
-            maxflow.add_constraint(f[e] >= 0)
-
-        # flow_in == flow_out for each node; source_out == sink_in
-        for n in self.G.adj:
-            if n == 'S' or n == 'T':
-                pass
-            else:
-                maxflow.add_constraint(
-                    pic.sum([f[(x, n)] for x in self.G.predecessors(n)]) == 
-                    pic.sum([f[(n, x)] for x in self.G.successors(n)])
-                )
-
-        # flow == flow out of source
-        maxflow.add_constraint(
-            F == pic.sum([f[('S', x)] for x in self.G.successors('S')])
-        )
-
-        # seems like this overconstrains the system sometimes...
-        # flow out of source == flow into sink
-        # maxflow.add_constraint(
-        #     pic.sum([f[(x, 'T')] for x in self.G.predecessors('T')]) ==
-        #     pic.sum([f[('S', x)] for x in self.G.successors('S')])
-        # ) 
-
-        # set objective and solve
-        # print(maxflow)
-        maxflow.set_objective("max", F)  
-        maxflow.solve(solver="cvxopt")   
-        
-        games_remaining = sum([x for x in saturated_edges.values()])
-        flow = float(F) # this is very dumb
-        """
-        An essay on overloading operators: Alex Wenstrup
+        # one flow variable per edge, bounded by that edge's capacity in the
+        # capacity matrix built by create_network
+        bounds = np.column_stack([np.zeros(self.flow_graph.nnz), self.flow_graph.data])
 
-        Never do this. Especially here and now. Please.
-        """
+        from scipy.optimize import linprog
+
+        res = linprog(self._lp_c, A_eq=self._lp_A_eq, b_eq=self._lp_b_eq, bounds=bounds, method="highs")
+
+        games_remaining = self._games_remaining
+        flow = -res.fun
         return not (abs(flow - games_remaining) < 0.1)
 
 
@@ -236,56 +303,42 @@ class Division:
     def __str__(self):
         '''Returns pretty string representation of a division object.
         '''
-        temp = ''
-        for key in self.teams:
-            temp = temp + f'{key}: {str(self.teams[key])} \n'
-        return temp
+        return ''.join(f'{key}: {team} \n' for key, team in self.teams.items())
 
-class Team:
+class Team(namedtuple('Team', ['ID', 'name', 'wins', 'losses', 'remaining'])):
     '''
-    The Team class represents one team within a badminton division for use in
-    solving the badminton elimination problem. This class includes information
-    on how many games the team has won and lost so far this season as well as
-    information on what games they have left for the season.
+    The Team class is a read-only record of one team within a badminton
+    division, used for printing and for looking teams up by name. The numbers
+    used for solving live in the Division's arrays, indexed by ID.
 
     ID: ID to keep track of the given team
-    teamname: human readable name associated with the team
+    name: human readable name associated with the team
     wins: number of games they have won so far
     losses: number of games they have lost so far
     remaining: number of games they have left this season
-    against: dictionary that can tell us how many games they have left against
-    each of the other teams
     '''
 
-    def __init__(self, ID, teamname, wins, losses, remaining, against):
-        self.ID = ID
-        self.name = teamname
-        self.wins = wins
-        self.losses = losses
-        self.remaining = remaining
-        self.against = against
-
-    def get_against(self, other_team=None):
-        '''Returns number of games this team has against this other team.
-        Raises an error if these teams don't play each other.
-        '''
-        try:
-            num_games = self.against[other_team]
-        except:
-            raise ValueError("Team does not exist in given input.")
-
-        return num_games
+    __slots__ = ()
 
     def __str__(self):
         '''Returns pretty string representation of a team object.
         '''
         return f'{self.name} \t {self.wins} wins \t {self.losses} losses \t {self.remaining} remaining'
 
+def _check(division, teamID):
+    '''Checks one team of the division with the linear programming solver.
+    Module level so that it can be sent to worker processes.
+    '''
+    return division.is_eliminated(teamID, "Linear Programming")
+
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         filename = sys.argv[1]
         division = Division(filename)
-        for (ID, team) in division.teams.items():
-            print(f'{team.name}: Eliminated? {division.is_eliminated(team.ID, "Linear Programming")}')
+        # every team's check is independent, so spread them over all cores
+        with ProcessPoolExecutor() as ex:
+            results = list(ex.map(partial(_check, division), division.teams.keys()))
+        for (ID, team), eliminated in zip(division.teams.items(), results):
+            print(f'{team.name}: Eliminated? {eliminated}')
     else:
         print("To run this code, please specify an input file name. Example: python badminton_elimination.py teams2.txt.")
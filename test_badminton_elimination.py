@@ -87,9 +87,36 @@ def test_teams24():
             assert_not_eliminated(division, team)
     print("test_teams24 completed")
 
+def test_flow_funcs():
+    '''Checks that every max flow function available to network flows
+    agrees on each team of the input matrix stored in teams24.txt.
+    '''
+    division = Division("teams24.txt")
+    for (ID, team) in division.teams.items():
+        saturated_edges = division.create_network(ID)
+        assert (division.network_flows(saturated_edges, flow_func="dinitz")
+            == division.network_flows(saturated_edges, flow_func="edmonds_karp"))
+    print("test_flow_funcs completed")
+
+def test_unknown_team():
+    '''Checks that asking about a team ID that is not in the division raises
+    a ValueError instead of indexing the division's arrays.
+    '''
+    division = Division("teams4.txt")
+    for ID in (-1, 4):
+        try:
+            division.is_eliminated(ID, "Network Flows")
+        except ValueError:
+            pass
+        else:
+            assert False, f"Team {ID} should not exist."
+    print("test_unknown_team completed")
+
 if __name__ == '__main__':
     test_teams2()
     test_teams4()
     test_teams7()
     test_teams24()
+    test_flow_funcs()
+    test_unknown_team()
     print("All tests have completed.")